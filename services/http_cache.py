@@ -0,0 +1,426 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import urljoin
+
+if TYPE_CHECKING:
+    import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# أقصى حجم لجسم الاستجابة الذي نقبل تخزينه (بايت)
+MAX_BODY_BYTES = 5 * 1024 * 1024
+
+# أقصى مدة صلاحية تقديرية عند غياب Cache-Control/Expires (ثوان)
+MAX_HEURISTIC_TTL = 24 * 60 * 60
+
+# ترويسات الاستجابة التي تُحدّثها استجابة 304 فوق الترويسات المخزنة
+REVALIDATION_HEADERS = ("Cache-Control", "Expires", "Date", "Age", "ETag", "Last-Modified", "Vary")
+
+# أقصى عدد لإعادات التوجيه التي نتبعها في الطلب الواحد
+MAX_REDIRECTS = 5
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+ENTRY_COLUMNS = (
+    "body_hash", "status", "content_type", "etag", "last_modified",
+    "cache_control", "expires", "expires_at",
+)
+
+
+@dataclass
+class CachedResponse:
+    """استجابة HTTP مقروءة من الشبكة أو من الذاكرة المؤقتة"""
+    url: str
+    status: int
+    body: bytes
+    body_hash: str
+    content_type: str
+    from_cache: bool
+
+
+async def http_get(session: "aiohttp.ClientSession", url: str, headers: Dict[str, str],
+                   url_guard: Optional[Callable[[str], Awaitable[None]]] = None) -> Tuple[int, Dict, bytes]:
+    """طلب GET وقراءة الجسم كاملاً مع احترام الحد الأقصى للحجم
+
+    إعادات التوجيه تُتبع يدوياً حتى يمر كل رابط وسيط على url_guard.
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        if url_guard:
+            await url_guard(url)
+
+        async with session.get(url, headers=headers, allow_redirects=False) as response:
+            if response.status in REDIRECT_STATUSES and "Location" in response.headers:
+                url = urljoin(url, response.headers["Location"])
+                continue
+
+            if response.status == 304:
+                return response.status, response.headers, b""
+
+            if response.content_length and response.content_length > MAX_BODY_BYTES:
+                raise ValueError("الصفحة أكبر من الحجم المسموح به")
+
+            chunks = []
+            size = 0
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                size += len(chunk)
+                if size > MAX_BODY_BYTES:
+                    raise ValueError("الصفحة أكبر من الحجم المسموح به")
+                chunks.append(chunk)
+
+            return response.status, response.headers, b"".join(chunks)
+
+    raise ValueError("عدد كبير من إعادات التوجيه")
+
+
+class HttpCache:
+    """ذاكرة مؤقتة دائمة على القرص لاستجابات HTTP
+
+    - الأجسام مضغوطة ومخزنة حسب بصمة المحتوى (sha256)
+    - فهرس البيانات الوصفية في SQLite
+    - احترام Cache-Control و ETag و Last-Modified مع طلبات GET شرطية
+    - حذف الأقدم استخداماً (LRU) عند تجاوز الحجم المحدد
+
+    كل عمليات القرص وقاعدة البيانات تعمل في خيط منفصل عبر asyncio.to_thread
+    حتى لا تعطل حلقة الأحداث، ويحمي القفل الاتصال المشترك.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 200 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.bodies_dir = os.path.join(cache_dir, "bodies")
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        os.makedirs(self.bodies_dir, exist_ok=True)
+
+        self.db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite3"), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS bodies (
+                hash TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                body_hash TEXT NOT NULL REFERENCES bodies(hash),
+                status INTEGER NOT NULL,
+                content_type TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                cache_control TEXT,
+                expires TEXT,
+                expires_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS summaries (
+                body_hash TEXT PRIMARY KEY REFERENCES bodies(hash),
+                summary TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS bodies_lru ON bodies(last_access);
+            CREATE INDEX IF NOT EXISTS entries_body ON entries(body_hash);
+            """
+        )
+        self.db.commit()
+
+    def close(self):
+        """إغلاق اتصال قاعدة البيانات"""
+        with self._lock:
+            self.db.close()
+
+    # ------------------------------------------------------------------
+    # الجلب
+    # ------------------------------------------------------------------
+
+    async def fetch(self, session: "aiohttp.ClientSession", url: str,
+                    headers: Optional[Dict[str, str]] = None,
+                    url_guard: Optional[Callable[[str], Awaitable[None]]] = None) -> CachedResponse:
+        """جلب رابط مع استخدام النسخة المخزنة أو إعادة التحقق منها
+
+        url_guard يُستدعى قبل كل طلب وكل إعادة توجيه، ويرفع استثناءً لرفض الرابط.
+        """
+        entry = await asyncio.to_thread(self._get_entry, url)
+
+        if entry and entry["expires_at"] > time.time():
+            body = await asyncio.to_thread(self._read_body, entry["body_hash"])
+            if body is not None:
+                return await self._cached_response(url, entry, body)
+            entry = None
+
+        request_headers = dict(headers or {})
+        if entry:
+            if entry["etag"]:
+                request_headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                request_headers["If-Modified-Since"] = entry["last_modified"]
+
+        status, response_headers, body = await http_get(session, url, request_headers, url_guard)
+
+        if status == 304 and entry:
+            cached_body = await asyncio.to_thread(self._read_body, entry["body_hash"])
+            if cached_body is not None:
+                await asyncio.to_thread(self._revalidated, url, entry, response_headers)
+                return await self._cached_response(url, entry, cached_body)
+            # اختفى الجسم من القرص: نعيد الطلب بدون شروط
+            status, response_headers, body = await http_get(session, url, dict(headers or {}), url_guard)
+
+        body_hash = hashlib.sha256(body).hexdigest()
+        content_type = response_headers.get("Content-Type", "")
+        if status == 200:
+            await asyncio.to_thread(
+                self._store, url, status, content_type, body, body_hash, response_headers
+            )
+
+        return CachedResponse(url, status, body, body_hash, content_type, False)
+
+    async def _cached_response(self, url: str, entry: Dict, body: bytes) -> CachedResponse:
+        await asyncio.to_thread(self._touch, entry["body_hash"])
+        return CachedResponse(url, entry["status"], body, entry["body_hash"], entry["content_type"], True)
+
+    # ------------------------------------------------------------------
+    # الملخصات
+    # ------------------------------------------------------------------
+
+    async def get_summary(self, body_hash: str) -> Optional[str]:
+        """ملخص محفوظ مسبقاً لجسم بهذه البصمة"""
+        return await asyncio.to_thread(self._get_summary, body_hash)
+
+    async def put_summary(self, body_hash: str, summary: str):
+        """حفظ ملخص مرتبط ببصمة الجسم (يُحذف مع الجسم عند الإخلاء)"""
+        await asyncio.to_thread(self._put_summary, body_hash, summary)
+
+    def _get_summary(self, body_hash: str) -> Optional[str]:
+        with self._lock:
+            row = self.db.execute(
+                "SELECT summary FROM summaries WHERE body_hash = ?", (body_hash,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _put_summary(self, body_hash: str, summary: str):
+        with self._lock:
+            exists = self.db.execute("SELECT 1 FROM bodies WHERE hash = ?", (body_hash,)).fetchone()
+            if not exists:
+                return
+            self.db.execute(
+                "INSERT OR REPLACE INTO summaries (body_hash, summary) VALUES (?, ?)",
+                (body_hash, summary),
+            )
+            self.db.commit()
+
+    # ------------------------------------------------------------------
+    # الفهرس والتخزين (تعمل داخل خيط منفصل)
+    # ------------------------------------------------------------------
+
+    def _get_entry(self, url: str) -> Optional[Dict]:
+        with self._lock:
+            row = self.db.execute(
+                f"SELECT {', '.join(ENTRY_COLUMNS)} FROM entries WHERE url = ?", (url,)
+            ).fetchone()
+        return dict(zip(ENTRY_COLUMNS, row)) if row else None
+
+    def _touch(self, body_hash: str):
+        with self._lock:
+            self.db.execute(
+                "UPDATE bodies SET last_access = ? WHERE hash = ?", (time.time(), body_hash)
+            )
+            self.db.commit()
+
+    def _revalidated(self, url: str, entry: Dict, headers):
+        """تحديث الصلاحية والمعرفات بعد استجابة 304
+
+        استجابة 304 قد لا تحمل Cache-Control أو Expires، لذلك تُدمج ترويساتها
+        فوق ترويسات الاستجابة الأصلية المخزنة قبل إعادة حساب الصلاحية.
+        """
+        merged = {
+            "Cache-Control": entry["cache_control"],
+            "Expires": entry["expires"],
+            "ETag": entry["etag"],
+            "Last-Modified": entry["last_modified"],
+        }
+        for name in REVALIDATION_HEADERS:
+            if name in headers:
+                merged[name] = headers[name]
+        merged = {name: value for name, value in merged.items() if value is not None}
+
+        expires_at = self._expires_at(merged, merged.get("Last-Modified"))
+        if expires_at is None:
+            self._delete_entry(url)
+            return
+
+        with self._lock:
+            self.db.execute(
+                "UPDATE entries SET etag = ?, last_modified = ?, cache_control = ?, "
+                "expires = ?, expires_at = ? WHERE url = ?",
+                (merged.get("ETag"), merged.get("Last-Modified"), merged.get("Cache-Control"),
+                 merged.get("Expires"), expires_at, url),
+            )
+            self.db.commit()
+        entry.update(
+            etag=merged.get("ETag"),
+            last_modified=merged.get("Last-Modified"),
+            cache_control=merged.get("Cache-Control"),
+            expires=merged.get("Expires"),
+            expires_at=expires_at,
+        )
+
+    def _store(self, url: str, status: int, content_type: str, body: bytes,
+               body_hash: str, headers):
+        expires_at = self._expires_at(headers, headers.get("Last-Modified"))
+        if expires_at is None:
+            self._delete_entry(url)
+            return
+
+        # الضغط خارج القفل، والكتابة مع إدراج السطر تحت القفل نفسه حتى لا
+        # يحذف _evict أو _read_body الملف بينهما
+        compressed = zlib.compress(body, 6)
+        path = self._body_path(body_hash)
+
+        with self._lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(compressed)
+                os.replace(tmp_path, path)
+
+            old = self._get_entry(url)
+            self.db.execute(
+                "INSERT OR REPLACE INTO bodies (hash, size, last_access) VALUES (?, ?, ?)",
+                (body_hash, len(compressed), time.time()),
+            )
+            self.db.execute(
+                "INSERT OR REPLACE INTO entries "
+                f"(url, {', '.join(ENTRY_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, body_hash, status, content_type, headers.get("ETag"),
+                 headers.get("Last-Modified"), headers.get("Cache-Control"),
+                 headers.get("Expires"), expires_at),
+            )
+            if old and old["body_hash"] != body_hash:
+                self._drop_body_if_orphan(old["body_hash"])
+            self.db.commit()
+            self._evict()
+
+    def _delete_entry(self, url: str):
+        with self._lock:
+            old = self._get_entry(url)
+            if not old:
+                return
+            self.db.execute("DELETE FROM entries WHERE url = ?", (url,))
+            self._drop_body_if_orphan(old["body_hash"])
+            self.db.commit()
+
+    def _drop_body_if_orphan(self, body_hash: str):
+        used = self.db.execute(
+            "SELECT 1 FROM entries WHERE body_hash = ? LIMIT 1", (body_hash,)
+        ).fetchone()
+        if not used:
+            self._drop_body(body_hash)
+
+    def _drop_body(self, body_hash: str):
+        self.db.execute("DELETE FROM entries WHERE body_hash = ?", (body_hash,))
+        self.db.execute("DELETE FROM summaries WHERE body_hash = ?", (body_hash,))
+        self.db.execute("DELETE FROM bodies WHERE hash = ?", (body_hash,))
+        try:
+            os.remove(self._body_path(body_hash))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        """حذف الأجسام الأقدم استخداماً حتى يعود الحجم تحت الحد"""
+        with self._lock:
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM bodies").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = self.db.execute("SELECT hash, size FROM bodies ORDER BY last_access").fetchall()
+            for body_hash, size in rows:
+                if total <= self.max_bytes:
+                    break
+                self._drop_body(body_hash)
+                total -= size
+            self.db.commit()
+
+    def _body_path(self, body_hash: str) -> str:
+        return os.path.join(self.bodies_dir, body_hash[:2], f"{body_hash}.z")
+
+    def _read_body(self, body_hash: str) -> Optional[bytes]:
+        try:
+            with open(self._body_path(body_hash), "rb") as f:
+                return zlib.decompress(f.read())
+        except (FileNotFoundError, zlib.error):
+            logger.warning(f"Cache body missing or corrupt: {body_hash}")
+            with self._lock:
+                self._drop_body(body_hash)
+                self.db.commit()
+            return None
+
+    # ------------------------------------------------------------------
+    # سياسة الصلاحية
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _parse_cache_control(value: str) -> Dict[str, Optional[str]]:
+        directives = {}
+        for part in value.split(","):
+            name, _, arg = part.strip().partition("=")
+            if name:
+                directives[name.lower()] = arg.strip('"') if arg else None
+        return directives
+
+    @staticmethod
+    def _parse_date(value: Optional[str]) -> Optional[float]:
+        if not value:
+            return None
+        try:
+            return parsedate_to_datetime(value).timestamp()
+        except (TypeError, ValueError):
+            return None
+
+    def _expires_at(self, headers, last_modified: Optional[str]) -> Optional[float]:
+        """وقت انتهاء الصلاحية، أو None إذا كان التخزين ممنوعاً
+
+        البوت يخدم عدة مستخدمين، لذلك نعامله كذاكرة مشتركة:
+        private و no-store يمنعان التخزين، و s-maxage يتقدم على max-age.
+        """
+        now = time.time()
+        if headers.get("Vary", "").strip() == "*":
+            return None
+
+        cc = self._parse_cache_control(headers.get("Cache-Control", ""))
+        if "no-store" in cc or "private" in cc:
+            return None
+        if "no-cache" in cc:
+            return now
+
+        age = 0
+        try:
+            age = max(0, int(headers.get("Age", "0")))
+        except ValueError:
+            pass
+
+        for directive in ("s-maxage", "max-age"):
+            if directive in cc:
+                try:
+                    return now + max(0, int(cc[directive]) - age)
+                except (TypeError, ValueError):
+                    return now
+
+        date = self._parse_date(headers.get("Date")) or now
+        if "Expires" in headers:
+            expires = self._parse_date(headers.get("Expires"))
+            return now + max(0, expires - date) if expires else now
+
+        # تقدير الصلاحية: 10% من عمر الصفحة منذ آخر تعديل
+        modified = self._parse_date(last_modified)
+        if modified and modified < date:
+            return now + min((date - modified) / 10, MAX_HEURISTIC_TTL)
+
+        # لا معلومات صلاحية: نخزن للاستفادة من إعادة التحقق وملخصات البصمة فقط
+        return now
+
@@ -1,14 +1,82 @@
 import aiohttp
-from typing import List, Dict
+import asyncio
+import hashlib
+import ipaddress
+import os
+import socket
+from bs4 import BeautifulSoup
+from typing import List, Dict, Optional
+from urllib.parse import urlsplit
 import logging
+from services.http_cache import CachedResponse, HttpCache, http_get
 
 logger = logging.getLogger(__name__)
 
+# أنواع المحتوى التي يمكن تلخيصها
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+
+
+async def ensure_public_url(url: str):
+    """رفض الروابط التي تشير إلى عناوين داخلية (loopback، خاصة، link-local...)"""
+    parsed = urlsplit(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("الرابط غير صالح")
+    
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            parsed.hostname, port, type=socket.SOCK_STREAM
+        )
+    except socket.gaierror:
+        raise ValueError(f"تعذر العثور على الخادم {parsed.hostname}")
+    
+    for info in infos:
+        ip = ipaddress.ip_address(info[4][0].split("%")[0])
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global:
+            raise ValueError("لا يمكن جلب روابط الشبكات الداخلية")
+
 class WebSearchService:
     """خدمة بحث مبسطة"""
     
     def __init__(self):
         self.user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+        # تُنشأ الذاكرة المؤقتة عند أول استخدام حتى لا يمنع خطأ فيها تشغيل البوت
+        self.http_cache: Optional[HttpCache] = None
+        self._http_cache_failed = False
+        self._http_cache_lock = asyncio.Lock()
+    
+    async def get_http_cache(self) -> Optional[HttpCache]:
+        """الذاكرة المؤقتة على القرص، أو None إذا تعذر تجهيزها"""
+        async with self._http_cache_lock:
+            if self.http_cache is None and not self._http_cache_failed:
+                try:
+                    # على Railway يجب أن يشير HTTP_CACHE_DIR إلى Volume حتى يبقى بعد إعادة النشر
+                    self.http_cache = await asyncio.to_thread(
+                        HttpCache,
+                        os.getenv('HTTP_CACHE_DIR', '.cache/http'),
+                        max_bytes=int(os.getenv('HTTP_CACHE_MAX_MB', '200')) * 1024 * 1024
+                    )
+                except Exception as e:
+                    logger.error(f"HTTP cache disabled: {e}")
+                    self._http_cache_failed = True
+            return self.http_cache
+    
+    async def fetch_page(self, url: str) -> CachedResponse:
+        """جلب صفحة عبر الذاكرة المؤقتة على القرص (أو مباشرة إذا كانت معطلة)"""
+        headers = {"User-Agent": self.user_agent}
+        cache = await self.get_http_cache()
+        timeout = aiohttp.ClientTimeout(total=15)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            if cache:
+                return await cache.fetch(session, url, headers=headers, url_guard=ensure_public_url)
+            
+            status, response_headers, body = await http_get(session, url, headers, ensure_public_url)
+            return CachedResponse(
+                url, status, body, hashlib.sha256(body).hexdigest(),
+                response_headers.get("Content-Type", ""), False
+            )
     
     async def search_web(self, query: str, num_results: int = 3) -> List[Dict]:
         """بحث مبسط في الويب"""
@@ -30,8 +98,53 @@ class WebSearchService:
             return []
     
     async def summarize_webpage(self, url: str) -> str:
-        """تلخيص صفحة ويب (مبسط)"""
-        return f"📄 **ملخص الصفحة:**\nيمكنني تلخيص الصفحات عند رفع البوت على Railway.\n\nالرابط: {url}"
+        """تلخيص صفحة ويب"""
+        page = await self.fetch_page(url)
+        if page.status != 200:
+            raise ValueError(f"استجابة غير متوقعة من الخادم ({page.status})")
+        
+        mime_type = page.content_type.split(";")[0].strip().lower()
+        if mime_type not in HTML_CONTENT_TYPES:
+            raise ValueError(f"نوع المحتوى غير مدعوم للتلخيص ({mime_type or 'غير معروف'})")
+        
+        # الصفحة لم تتغير: نعيد الملخص المحفوظ بدون إعادة التحليل
+        cache = await self.get_http_cache()
+        summary = await cache.get_summary(page.body_hash) if cache else None
+        if summary is None:
+            summary = await asyncio.to_thread(self._extract_summary, page.body)
+            if cache:
+                await cache.put_summary(page.body_hash, summary)
+        
+        return f"{summary}\n\nالرابط: {url}"
+    
+    def _extract_summary(self, html: bytes, max_chars: int = 1500) -> str:
+        """استخراج العنوان وأول الفقرات من صفحة HTML"""
+        soup = BeautifulSoup(html, "lxml")
+        for tag in soup(["script", "style", "nav", "header", "footer", "aside"]):
+            tag.decompose()
+        
+        parts = []
+        if soup.title and soup.title.string:
+            parts.append(f"**{soup.title.string.strip()}**")
+        
+        description = soup.find("meta", attrs={"name": "description"})
+        if description and description.get("content"):
+            parts.append(description["content"].strip())
+        
+        length = sum(len(p) for p in parts)
+        for paragraph in soup.find_all("p"):
+            text = paragraph.get_text(" ", strip=True)
+            if len(text) < 40:
+                continue
+            if length + len(text) > max_chars:
+                parts.append(text[:max(0, max_chars - length)] + "...")
+                break
+            parts.append(text)
+            length += len(text)
+        
+        if not parts:
+            return "لم أجد نصاً قابلاً للتلخيص في هذه الصفحة."
+        return "\n\n".join(parts)
     
     async def get_news(self, topic: str = "technology") -> List[Dict]:
         """أخبار (مبسطة)"""
@@ -0,0 +1,41 @@
+class FakeContent:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def iter_chunked(self, size):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class FakeResponse:
+    def __init__(self, status, headers, chunks=()):
+        self.status = status
+        self.headers = headers
+        self.content = FakeContent(list(chunks))
+        self.content_length = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """جلسة وهمية تعيد الاستجابات بالترتيب وتسجل الطلبات"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.urls = []
+
+    def get(self, url, headers=None, allow_redirects=True):
+        self.urls.append(url)
+        self.requests.append(dict(headers or {}))
+        return self.responses.pop(0)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
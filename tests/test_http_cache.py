@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import tempfile
+import time
+import unittest
+from email.utils import formatdate
+
+from services.http_cache import MAX_HEURISTIC_TTL, HttpCache, http_get
+from tests.fakes import FakeResponse, FakeSession
+
+
+def http_date(timestamp: float) -> str:
+    return formatdate(timestamp, usegmt=True)
+
+
+def make_cache(test):
+    tmp = tempfile.TemporaryDirectory()
+    test.addCleanup(tmp.cleanup)
+    cache = HttpCache(tmp.name)
+    test.addCleanup(cache.close)
+    return cache
+
+
+class ExpiresAtTests(unittest.TestCase):
+    def setUp(self):
+        self.cache = make_cache(self)
+
+    def ttl(self, headers, last_modified=None):
+        expires_at = self.cache._expires_at(headers, last_modified)
+        return None if expires_at is None else expires_at - time.time()
+
+    def test_no_store_and_private_are_not_stored(self):
+        self.assertIsNone(self.ttl({"Cache-Control": "no-store"}))
+        self.assertIsNone(self.ttl({"Cache-Control": "private, max-age=60"}))
+        self.assertIsNone(self.ttl({"Vary": "*"}))
+
+    def test_no_cache_is_always_stale(self):
+        self.assertLessEqual(self.ttl({"Cache-Control": "no-cache, max-age=600"}), 0)
+
+    def test_s_maxage_wins_over_max_age_and_age_is_subtracted(self):
+        ttl = self.ttl({"Cache-Control": "max-age=60, s-maxage=600", "Age": "100"})
+        self.assertAlmostEqual(ttl, 500, delta=2)
+        self.assertAlmostEqual(self.ttl({"Cache-Control": "max-age=60", "Age": "100"}), 0, delta=2)
+
+    def test_expires_is_relative_to_date(self):
+        date = time.time() - 3600
+        ttl = self.ttl({"Date": http_date(date), "Expires": http_date(date + 300)})
+        self.assertAlmostEqual(ttl, 300, delta=2)
+        self.assertLessEqual(self.ttl({"Expires": "0"}), 0)
+
+    def test_last_modified_heuristic_is_capped(self):
+        now = time.time()
+        ttl = self.ttl({"Date": http_date(now)}, http_date(now - 1000))
+        self.assertAlmostEqual(ttl, 100, delta=2)
+        ttl = self.ttl({"Date": http_date(now)}, http_date(now - 365 * 24 * 3600))
+        self.assertAlmostEqual(ttl, MAX_HEURISTIC_TTL, delta=2)
+
+
+class StoreAndEvictTests(unittest.TestCase):
+    def setUp(self):
+        self.cache = make_cache(self)
+
+    def store(self, url, body, headers=None):
+        body_hash = hashlib.sha256(body).hexdigest()
+        self.cache._store(url, 200, "text/html", body, body_hash, headers or {"Cache-Control": "max-age=60"})
+        return body_hash
+
+    def test_new_body_for_same_url_drops_old_body_and_summary(self):
+        old_hash = self.store("u", b"old")
+        self.cache._put_summary(old_hash, "old summary")
+        new_hash = self.store("u", b"new")
+
+        self.assertEqual(self.cache._get_entry("u")["body_hash"], new_hash)
+        self.assertIsNone(self.cache._get_summary(old_hash))
+        self.assertIsNone(self.cache._read_body(old_hash))
+        self.assertEqual(self.cache._read_body(new_hash), b"new")
+
+    def test_shared_body_is_kept_while_referenced(self):
+        shared = self.store("a", b"same")
+        self.store("b", b"same")
+        self.store("a", b"other")
+        self.assertEqual(self.cache._read_body(shared), b"same")
+
+    def test_evict_drops_least_recently_used_first(self):
+        hashes = [self.store(f"u{i}", bytes([i]) * 1000) for i in range(3)]
+        for i, body_hash in enumerate(hashes):
+            self.cache.db.execute("UPDATE bodies SET last_access = ? WHERE hash = ?", (i, body_hash))
+        # استخدام أقدم جسم يجعله الأحدث
+        self.cache._touch(hashes[0])
+
+        size = self.cache.db.execute("SELECT size FROM bodies WHERE hash = ?", (hashes[0],)).fetchone()[0]
+        self.cache.max_bytes = size
+        self.cache._evict()
+
+        self.assertIsNotNone(self.cache._get_entry("u0"))
+        self.assertIsNone(self.cache._get_entry("u1"))
+        self.assertIsNone(self.cache._get_entry("u2"))
+
+    def test_no_store_response_removes_existing_entry(self):
+        self.store("u", b"body")
+        self.store("u", b"body", {"Cache-Control": "no-store"})
+        self.assertIsNone(self.cache._get_entry("u"))
+
+
+class FetchTests(unittest.TestCase):
+    def setUp(self):
+        self.cache = make_cache(self)
+
+    def fetch(self, session):
+        return asyncio.run(self.cache.fetch(session, "http://example.com/"))
+
+    def test_body_split_across_chunks_is_read_completely(self):
+        session = FakeSession(FakeResponse(200, {"Cache-Control": "max-age=60"}, [b"ab", b"cd", b"ef"]))
+        page = self.fetch(session)
+        self.assertEqual(page.body, b"abcdef")
+        self.assertEqual(page.body_hash, hashlib.sha256(b"abcdef").hexdigest())
+
+    def test_fresh_entry_is_served_without_request(self):
+        self.fetch(FakeSession(FakeResponse(200, {"Cache-Control": "max-age=60"}, [b"x"])))
+        session = FakeSession()
+        page = self.fetch(session)
+        self.assertTrue(page.from_cache)
+        self.assertEqual(session.requests, [])
+
+    def test_no_cache_is_kept_after_304_without_cache_control(self):
+        now = time.time()
+        self.fetch(FakeSession(FakeResponse(200, {
+            "Cache-Control": "no-cache",
+            "ETag": '"v1"',
+            "Date": http_date(now),
+            "Last-Modified": http_date(now - 365 * 24 * 3600),
+        }, [b"page"])))
+
+        session = FakeSession(FakeResponse(304, {"Date": http_date(now)}))
+        page = self.fetch(session)
+        self.assertTrue(page.from_cache)
+        self.assertEqual(page.body, b"page")
+        self.assertEqual(session.requests[0]["If-None-Match"], '"v1"')
+        self.assertLessEqual(self.cache._get_entry("http://example.com/")["expires_at"], time.time())
+
+    def test_max_age_is_kept_after_304_without_cache_control(self):
+        self.fetch(FakeSession(FakeResponse(200, {"Cache-Control": "max-age=3600", "ETag": '"v1"'}, [b"page"])))
+        self.cache.db.execute("UPDATE entries SET expires_at = 0")
+
+        self.fetch(FakeSession(FakeResponse(304, {})))
+        ttl = self.cache._get_entry("http://example.com/")["expires_at"] - time.time()
+        self.assertAlmostEqual(ttl, 3600, delta=2)
+
+    def test_304_with_missing_body_retries_unconditionally(self):
+        page = self.fetch(FakeSession(FakeResponse(200, {"ETag": '"v1"'}, [b"old"])))
+        self.cache._drop_body(page.body_hash)
+        # إعادة إدخال الفهرس دون الجسم لمحاكاة جسم مفقود من القرص
+        self.cache.db.execute(
+            "INSERT INTO entries (url, body_hash, status, content_type, etag, expires_at) "
+            "VALUES (?, ?, 200, '', '\"v1\"', 0)",
+            ("http://example.com/", page.body_hash),
+        )
+
+        session = FakeSession(FakeResponse(304, {}), FakeResponse(200, {}, [b"new"]))
+        page = self.fetch(session)
+        self.assertEqual(page.body, b"new")
+        self.assertNotIn("If-None-Match", session.requests[1])
+
+
+class HttpGetTests(unittest.TestCase):
+    def test_redirects_are_followed_and_each_hop_is_guarded(self):
+        checked = []
+
+        async def guard(url):
+            checked.append(url)
+
+        session = FakeSession(
+            FakeResponse(302, {"Location": "/next"}),
+            FakeResponse(200, {}, [b"done"]),
+        )
+        status, _, body = asyncio.run(http_get(session, "http://example.com/start", {}, guard))
+        self.assertEqual((status, body), (200, b"done"))
+        self.assertEqual(checked, ["http://example.com/start", "http://example.com/next"])
+
+    def test_guard_rejection_stops_the_redirect(self):
+        async def guard(url):
+            if "169.254" in url:
+                raise ValueError("blocked")
+
+        session = FakeSession(FakeResponse(302, {"Location": "http://169.254.169.254/"}))
+        with self.assertRaises(ValueError):
+            asyncio.run(http_get(session, "http://example.com/", {}, guard))
+        self.assertEqual(session.urls, ["http://example.com/"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from services import search_service
+from services.search_service import WebSearchService, ensure_public_url
+from tests.fakes import FakeResponse, FakeSession
+
+PAGE = b"<html><title>Test</title><p>" + b"paragraph text " * 10 + b"</p></html>"
+
+
+async def allow_all(url):
+    pass
+
+
+class SummarizeWebpageTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        env = mock.patch.dict(os.environ, {"HTTP_CACHE_DIR": tmp.name})
+        env.start()
+        self.addCleanup(env.stop)
+        guard = mock.patch.object(search_service, "ensure_public_url", allow_all)
+        guard.start()
+        self.addCleanup(guard.stop)
+
+        self.service = WebSearchService()
+        self.addCleanup(lambda: self.service.http_cache and self.service.http_cache.close())
+
+    def summarize(self, session):
+        with mock.patch.object(search_service.aiohttp, "ClientSession", return_value=session):
+            return asyncio.run(self.service.summarize_webpage("http://example.com/"))
+
+    def test_unchanged_page_is_parsed_once(self):
+        headers = {"Content-Type": "text/html; charset=utf-8", "ETag": '"v1"', "Cache-Control": "no-cache"}
+        with mock.patch.object(
+            WebSearchService, "_extract_summary", autospec=True, return_value="summary"
+        ) as extract:
+            first = self.summarize(FakeSession(FakeResponse(200, headers, [PAGE])))
+            # 304 بعد إعادة التحقق
+            second = self.summarize(FakeSession(FakeResponse(304, {})))
+            # 200 بنفس الجسم بعد إعادة التحقق
+            third = self.summarize(FakeSession(FakeResponse(200, headers, [PAGE])))
+
+        self.assertEqual(extract.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(first, third)
+
+    def test_non_html_content_is_rejected(self):
+        session = FakeSession(FakeResponse(200, {"Content-Type": "application/pdf"}, [b"%PDF-1.4"]))
+        with self.assertRaises(ValueError):
+            self.summarize(session)
+
+    def test_broken_cache_config_falls_back_to_uncached_fetch(self):
+        with mock.patch.dict(os.environ, {"HTTP_CACHE_MAX_MB": "lots"}):
+            summary = self.summarize(FakeSession(FakeResponse(200, {"Content-Type": "text/html"}, [PAGE])))
+        self.assertIn("Test", summary)
+        self.assertIsNone(self.service.http_cache)
+
+
+class EnsurePublicUrlTests(unittest.TestCase):
+    def test_internal_addresses_are_rejected(self):
+        for url in (
+            "http://localhost/",
+            "http://127.0.0.1:8080/",
+            "http://10.0.0.5/",
+            "http://192.168.1.1/",
+            "http://169.254.169.254/latest/meta-data/",
+            "http://[::1]/",
+            "http://[::ffff:127.0.0.1]/",
+            "ftp://example.com/",
+        ):
+            with self.subTest(url=url), self.assertRaises(ValueError):
+                asyncio.run(ensure_public_url(url))
+
+    def test_public_address_is_allowed(self):
+        asyncio.run(ensure_public_url("http://93.184.216.34/"))
+
+
+if __name__ == "__main__":
+    unittest.main()